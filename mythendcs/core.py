@@ -13,11 +13,13 @@ COUNTER_BITS = [4, 8, 16, 24]
 SETTINGS_MODES = ['StdCu', 'StdMo', 'HgCr', 'HgCu', 'FastCu', 'FastMo']
 SETTINGS = ['Cu', 'Mo', 'Cr', 'Ag']
 MATERIALS = {0: 'Si'}
+SETTINGS_NAMES = {0: 'Standard', 1: 'Highgain', 2: 'Fast', 3: 'Unknown'}
 
 TCP_PORT = 1031
 UDP_PORT = 1030
 TCP = socket.SOCK_STREAM
 UDP = socket.SOCK_DGRAM
+MSG_WAITALL = getattr(socket, 'MSG_WAITALL', 0)
 DEFAULT_TIMEOUT = object()
 
 ERR_MYTHEN_COMM_LENGTH = -40
@@ -84,8 +86,10 @@ class MythenError(Exception):
         return "Error {}: {}".format(self.errcode, self._get_error_msg())
 
     def _get_error_msg(self):
-        msg = ERRORS.get(self.errcode, "Unknown error code")
-        return msg.format(*self.args)
+        msg = ERRORS.get(self.errcode)
+        if msg is None:
+            return "Unknown error code"
+        return msg.format(*self.args) if self.args else msg
 
     def __repr__(self):
         return '{}({}, {!r})'.format(
@@ -142,11 +146,14 @@ def guard_timeout(connection, timeout):
 class Connection:
     """Communication channel"""
 
-    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT, kind=TCP, log=None):
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT, kind=TCP, log=None,
+                 rcvbuf=None):
         self.host = host
         self.port  = port
         self.timeout = timeout
         self.kind = kind
+        # socket receive buffer size (None means system default)
+        self.rcvbuf = rcvbuf
         self.socket = None
         self.fobj = None
         self.lock = threading.Lock()
@@ -165,13 +172,14 @@ class Connection:
         return "<{} {} {}>".format(kind, conn, (self.host, self.port))
 
     @classmethod
-    def from_url(cls, url, timeout=DEFAULT_TIMEOUT):
+    def from_url(cls, url, timeout=DEFAULT_TIMEOUT, rcvbuf=None):
         """Default scheme is TCP"""
         if "://" not in url:
             url = "tcp://" + url
         url = urllib.parse.urlparse(url)
         kind = UDP if url.scheme == "udp" else TCP
-        return cls(url.hostname, url.port, timeout=timeout, kind=kind)
+        return cls(url.hostname, url.port, timeout=timeout, kind=kind,
+                   rcvbuf=rcvbuf)
 
     def connect(self):
         self.disconnect()
@@ -180,6 +188,9 @@ class Connection:
             sock.settimeout(self.timeout)
         if self.kind == TCP:
             sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        if self.rcvbuf:
+            # must be set before connect for TCP window scaling to use it
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
         self.log.info("-> connecting")
         sock.connect((self.host, self.port))
         self.fobj = sock.makefile("rwb", buffering=0)
@@ -195,16 +206,17 @@ class Connection:
     def fileno(self):
         return None if self.socket is None else self.socket.fileno()
 
+    def _read_into(self, buff):
+        view, size = byte_view(buff)
+        return self.socket.recv_into(view, size)
+
     def _read_exactly_into(self, buff):
-        try:
-            size = buff.nbytes
-            view = buff.view(dtype=np.byte)
-        except AttributeError:
-            size = len(buff)
-            view = memoryview(buff)
+        view, size = byte_view(buff)
+        # over TCP ask the kernel for the whole remainder in a single call
+        flags = MSG_WAITALL if self.kind == TCP else 0
         offset = 0
         while offset < size:
-            n = self.socket.recv_into(view[offset:], size - offset)
+            n = self.socket.recv_into(view[offset:], size - offset, flags)
             if not n:
                 raise MythenError(ERR_MYTHEN_COMM_ERROR)
             offset += n
@@ -239,6 +251,32 @@ class Connection:
         self.log.debug("<- write_read(%r)", reply)
         return reply
 
+    @ensure_connection
+    def write_read_reply_into(self, data, buff, timeout=DEFAULT_TIMEOUT):
+        """
+        Write data and read the reply into buff, all under the connection
+        lock. A 4 byte negative reply is raised as an error. Otherwise the
+        rest of the reply (more TCP segments or UDP datagrams) is read
+        until buff is full.
+        """
+        self.log.debug("-> write_read_reply_into(%r)", data)
+        view, size = byte_view(buff)
+        with guard_timeout(self, timeout):
+            self.fobj.write(data)
+            n = self._read_into(view)
+            if not n:
+                raise MythenError(ERR_MYTHEN_COMM_ERROR)
+            # sizeof(int)
+            if n == 4:
+                value = to_int(view)
+                if value < 0:
+                    raise MythenError(value)
+            if n < size:
+                self._read_exactly_into(view[n:])
+                n = size
+        self.log.debug("<- write_read_reply_into %d bytes", n)
+        return n
+
     @ensure_connection
     def write_read_exactly_into(self, data, buff, timeout=DEFAULT_TIMEOUT):
         self.log.debug("-> write_read_exactly_into(%r)", data)
@@ -249,6 +287,15 @@ class Connection:
         return reply
 
 
+def byte_view(buff):
+    """Returns a writable byte view over buff and its size in bytes"""
+    try:
+        return buff.view(dtype=np.byte), buff.nbytes
+    except AttributeError:
+        view = memoryview(buff).cast('B')
+        return view, len(view)
+
+
 def to_int(d):
     return struct.unpack_from("<i", d)[0]
 
@@ -289,6 +336,26 @@ def command(connection, cmd, size=8192, timeout=DEFAULT_TIMEOUT):
     return raw_value
 
 
+def command_into(connection, cmd, buff, timeout=DEFAULT_TIMEOUT):
+    """
+    Send command to Mythen and store the answer in the given buffer.
+    It verifies if there are errors.
+    The answer is read until the buffer is full.
+    :param cmd: Command
+    :param buff: writable buffer (bytearray, numpy array, ...)
+    :return: memoryview over the answer
+    """
+    cmd = cmd.encode() if isinstance(cmd, str) else cmd
+    view, size = byte_view(buff)
+    try:
+        # a single locked call: no other command may slip in between the
+        # first and the last part of the answer
+        n = connection.write_read_reply_into(cmd, view, timeout=timeout)
+    except socket.timeout:
+        raise MythenError(ERR_MYTHEN_COMM_TIMEOUT)
+    return memoryview(view)[:n]
+
+
 def version(connection, timeout=DEFAULT_TIMEOUT):
     value = command(connection, '-get version', timeout=timeout)
     if len(value) != 7:
@@ -306,6 +373,8 @@ class Mythen:
     MASK_RUNNING = 1  # Bit 0
     MASK_WAIT_TRIGGER = 1 << 3  # Bit 3
     MASK_FIFO_EMPTY = 1 << 16  # Bit 16
+    STATUS_NAMES = ('ON', 'RUNNING')  # indexed by status & MASK_RUNNING
+    _rx = None  # reusable reception buffer, see _rx_buffer()
 
     def __init__(self, connection, nmod=1, log=None):
         """
@@ -329,7 +398,7 @@ class Mythen:
         self.continuoustrigger = False
 
     @classmethod
-    def from_url(cls, url, nmod=1):
+    def from_url(cls, url, nmod=1, rcvbuf=None, timeout=DEFAULT_TIMEOUT):
         if "://" not in url:
             tmp_url = urllib.parse.urlparse("void://" + url)
             scheme = "udp" if tmp_url.port == UDP_PORT else "tcp"
@@ -339,7 +408,21 @@ class Mythen:
         if port is None:
             port = UDP_PORT if scheme == "udp" else TCP_PORT
         url = "{}://{}:{}".format(scheme, url.hostname, port)
-        return cls(Connection.from_url(url), nmod=nmod)
+        connection = Connection.from_url(url, timeout=timeout, rcvbuf=rcvbuf)
+        return cls(connection, nmod=nmod)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the connection to the detector (it is reopened on the next
+        command).
+        """
+        self.connection.disconnect()
 
     # ------------------------------------------------------------------
     #   Commands
@@ -380,7 +463,9 @@ class Mythen:
         """
         if value <= 0:
             raise ValueError('The value should be greater than 0')
-        self.command('-autosettings %f' % value)
+        # loads new settings on every module: give it as long as a reset
+        timeout = 2.5 + 0.75 * self.nmods
+        self.command('-autosettings %f' % value, timeout=timeout)
 
     # ------------------------------------------------------------------
     #   Bad Channels
@@ -522,17 +607,10 @@ class Mythen:
         """
         raw_value = self.command('-get settings')
         value = to_int(raw_value)
-        if value == 0:
-            result = 'Standard'
-        elif value == 1:
-            result = 'Highgain'
-        elif value == 2:
-            result = 'Fast'
-        elif value == 3:
-            result = 'Unknown'
-        else:
+        try:
+            return SETTINGS_NAMES[value]
+        except KeyError:
             raise MythenError(ERR_MYTHEN_SETTINGS, value)
-        return result
 
     # ------------------------------------------------------------------
     #   Settings Mode
@@ -558,7 +636,9 @@ class Mythen:
         """
         if value not in SETTINGS_MODES:
             raise MythenError(ERR_MYTHEN_BAD_PARAMETER)
-        self.command('-settings %s' % value)
+        # loads new settings on every module: give it as long as a reset
+        timeout = 2.5 + 0.75 * self.nmods
+        self.command('-settings %s' % value, timeout=timeout)
 
     # ------------------------------------------------------------------
     #   Status
@@ -576,7 +656,7 @@ class Mythen:
         """
         :return: Return the status of the Mythen: On, Running or Wait Trigger.
         """
-        return "RUNNING" if self.raw_status & self.MASK_RUNNING else "ON"
+        return self.STATUS_NAMES[self.raw_status & self.MASK_RUNNING]
 
     # ------------------------------------------------------------------
     #   waitingtrigger
@@ -638,16 +718,35 @@ class Mythen:
         """
         :return: Numpy array with the count of each channels.
         """
-        raw_value = self.command('-readout')
-        values = to_int_list(raw_value)
-        if values[0] == -1:
-            raise MythenError(ERR_MYTHEN_READOUT)
-        if len(values) != self.nchannels:
-            raise MythenError(ERR_MYTHEN_COMM_LENGTH)
-        return values
+        rx = self._rx_buffer(4 * self.nchannels)
+        values = self.readout_into(np.frombuffer(rx, dtype='<i4'))
+        # rx is reused on the next readout: hand out a private copy
+        return values.copy()
 
-    def readout_into(self, buff):
-        return self.connection.write_read_exactly_into(b'-readout', buff)
+    def _rx_buffer(self, size):
+        """Returns a reusable reception buffer of the given size"""
+        rx = self._rx
+        if rx is None or len(rx) < size:
+            rx = self._rx = bytearray(size)
+        return memoryview(rx)[:size]
+
+    def readout_into(self, buff, timeout=DEFAULT_TIMEOUT):
+        """
+        :param buff: writable buffer for nchannels int32 values
+        :param timeout: max. time (s) to wait for the frame
+        :return: buff filled with the count of each channel.
+        """
+        try:
+            raw_value = command_into(self.connection, b'-readout', buff,
+                                     timeout=timeout)
+        except MythenError as error:
+            # a failed readout (ex: after a stop) answers -1
+            if error.errcode == -1:
+                raise MythenError(ERR_MYTHEN_READOUT)
+            raise
+        if raw_value.nbytes != 4 * self.nchannels:
+            raise MythenError(ERR_MYTHEN_COMM_LENGTH)
+        return buff
 
     # ------------------------------------------------------------------
     #   Readout Bits
@@ -945,7 +1044,9 @@ class Mythen4(Mythen):
 
     @energy.setter
     def energy(self, value):
-        return self.command("-energy {}".format(value))
+        # recomputes the settings of every module: as long as a reset
+        timeout = 2.5 + 0.75 * self.nmods
+        return self.command("-energy {}".format(value), timeout=timeout)
 
     @property
     def min_energy(self):
@@ -1044,7 +1145,9 @@ class Mythen4(Mythen):
         """
         if value not in SETTINGS:
             raise MythenError(ERR_MYTHEN_BAD_PARAMETER)
-        self.command('-settings %s' % value)
+        # loads new settings on every module: give it as long as a reset
+        timeout = 2.5 + 0.75 * self.nmods
+        self.command('-settings %s' % value, timeout=timeout)
 
     @property
     def test_pattern(self):
@@ -1231,6 +1334,7 @@ def gen_acquisition(mythen, nb_frames=1, exposure_time=1):
     mythen.inttime = exposure_time
     mythen.frames = nb_frames
     nchannels = mythen.num_channels
-    buff = np.empty((nb_frames, nchannels), '<i4')
     mythen.start()
+    # allocate while the detector is already exposing the first frame
+    buff = np.empty((nb_frames, nchannels), '<i4')
     return mythen.gen_readout(nb_frames, iter(buff))
@@ -23,14 +23,18 @@
 #         (c) - Controls group - ALBA
 # =============================================================================
 
+import os
 import PyTango
+import queue
 import threading
+import concurrent.futures
 import numpy as np
 import time
 import json
+import contextlib
 
 from .core import Mythen, UDP_PORT, TCP_PORT, COUNTER_BITS, \
-    SETTINGS_MODES, MythenError
+    SETTINGS_MODES, MythenError, ERR_MYTHEN_COMM_ERROR
 
 DEV_STATE_UNKNOWN = PyTango.DevState.UNKNOWN
 DEV_STATE_FAULT = PyTango.DevState.FAULT
@@ -42,19 +46,48 @@ DEV_STATE_INIT = PyTango.DevState.INIT
 # Decorator for managing the exception
 def ExceptionHandler(func):
     def new_func(*args, **kwargs):
+        obj = args[0]
+        # don't build the debug messages unless they are going to be logged
+        debug = obj.get_logger().is_debug_enabled()
+        if debug:
+            obj.debug_stream('Entering in %s' % func.__name__)
         try:
-            obj = args[0]
-            obj.debug_stream('Entering in %s (%s)' % (func.__name__,
-                                                      repr(args)))
             result = func(*args, **kwargs)
-            obj.debug_stream('Exiting %s' % func.__name__)
-            return result
         except Exception as e:
             obj.warn_stream('Hardware warning in %s: %s' % (func.__name__, e))
-            raise e
+            raise
+        if debug:
+            obj.debug_stream('Exiting %s' % func.__name__)
+        return result
     return new_func
 
 
+def parameter_attribute(param, attr_name, values=None):
+    """
+    Build the read and write methods of an attribute which maps directly
+    to a (cached) Mythen parameter.
+    :param param: Mythen parameter name
+    :param attr_name: Tango attribute name
+    :param values: if given, the valid values
+    :return: read and write methods
+    """
+    def read(self, the_att):
+        the_att.set_value(self._cached(param))
+
+    def write(self, the_att):
+        data = []
+        the_att.get_write_value(data)
+        if values is not None and data[0] not in values:
+            raise ValueError('Invalid value. %s' % repr(values))
+        setattr(self.mythen, param, data[0])
+        self._invalidate(param)
+        self.push_change_event(attr_name, data[0])
+
+    read.__name__ = 'read_' + attr_name
+    write.__name__ = 'write_' + attr_name
+    return ExceptionHandler(read), ExceptionHandler(write)
+
+
 class MythenDCSClass(PyTango.DeviceClass):
 
     # Class Properties
@@ -66,8 +99,26 @@ class MythenDCSClass(PyTango.DeviceClass):
         'HostIP': [PyTango.DevString, 'Mythen IP', ''],
         'Port': [PyTango.DevString, 'TCP or UDP', 'UDP'],
         'NMod': [PyTango.DevLong, 'Number of modules connected', 1],
-        'Timeout': [PyTango.DevLong, 'Serial port timeout', 3],
-        'NROIs': [PyTango.DevLong, 'Number of ROIs', 3]
+        'Timeout': [PyTango.DevLong,
+                    'Detector communication timeout in s (0 means none)', 3],
+        'NROIs': [PyTango.DevLong, 'Number of ROIs', 3],
+        'EventRateHz': [PyTango.DevDouble,
+                        'Max. rate of data events (0 means no limit)', 20],
+        'ROIAbsThreshold': [PyTango.DevDouble,
+                            'Min. absolute change of a ROI value to push '
+                            'its event (0 means disabled)', 0],
+        'ROIRelThreshold': [PyTango.DevDouble,
+                            'Min. relative change of a ROI value to push '
+                            'its event (0 means disabled)', 0],
+        'AcqPriority': [PyTango.DevLong,
+                        'SCHED_FIFO priority of the thread reading the '
+                        'frames (0 means no change)', 0],
+        'AcqCPU': [PyTango.DevLong,
+                   'CPU the thread reading the frames runs on '
+                   '(-1 means any)', -1],
+        'SocketRcvBuf': [PyTango.DevLong,
+                         'Socket receive buffer size (0 means system '
+                         'default, which keeps TCP autotuning)', 0],
         }
 
     # Command definitions
@@ -85,7 +136,9 @@ class MythenDCSClass(PyTango.DeviceClass):
                                   'None']],
                 'GetRawBuffer': [[PyTango.CmdArgType.DevLong64, 'None'],
                                  [PyTango.CmdArgType.DevString,
-                                  'None']]
+                                  'None']],
+                'Reconnect': [[PyTango.DevVoid, 'None'],
+                              [PyTango.DevVoid, 'None']],
 
                 }
 
@@ -136,6 +189,10 @@ class MythenDCSClass(PyTango.DeviceClass):
                        PyTango.AttrDataFormat.IMAGE,
                        PyTango.AttrWriteType.READ,
                        Mythen.MAX_CHANNELS, 30000]],
+        'NewImageData': [[PyTango.ArgType.DevLong,
+                          PyTango.AttrDataFormat.IMAGE,
+                          PyTango.AttrWriteType.READ,
+                          Mythen.MAX_CHANNELS, 30000]],
         'FramesReadies': [[PyTango.ArgType.DevULong64,
                            PyTango.AttrDataFormat.SCALAR,
                            PyTango.AttrWriteType.READ]],
@@ -164,56 +221,146 @@ class MythenDCSClass(PyTango.DeviceClass):
 
 
 class MythenDCSDevice(PyTango.Device_4Impl):
+
+    # Max. number of frames read from the detector waiting to be published
+    FRAME_QUEUE_SIZE = 8
+    # Period (s) of the detector state polling
+    STATE_POLL_PERIOD = 0.1
+    # bounds of the period (s) to poll for the next external trigger frame
+    MIN_POLL_PERIOD = 0.001
+    MAX_POLL_PERIOD = 0.1
+    # bounds of the delay (s) between connection attempts
+    MIN_CONNECT_DELAY = 1
+    MAX_CONNECT_DELAY = 60
+    # Detector parameters which may change when the key parameter is written
+    CACHE_IMPACT = {
+        'settingsmode': ('settings', 'tau', 'threshold'),
+        'threshold': ('settings', 'settingsmode'),
+    }
+    # Attribute events pushed after a reset and the parameter they show
+    RESET_EVENTS = (
+        ('ReadoutBits', 'readoutbits'), ('RateCorrection', 'rate'),
+        ('FlatFieldCorrection', 'flatfield'),
+        ('BadChnInterp', 'badchnintrpl'), ('Settings', 'settings'),
+        ('SettingsMode', 'settingsmode'), ('Tau', 'tau'),
+        ('IntTime', 'inttime'), ('Threshold', 'threshold'),
+    )
+
     # ------------------------------------------------------------------
     #   Device constructor
     # ------------------------------------------------------------------
     def __init__(self, cl, name):
 
+        # copy of the device state, see set_state()
+        self.cur_state = DEV_STATE_UNKNOWN
         PyTango.Device_4Impl.__init__(self, cl, name)
         self.info_stream('In MythenDCSDevice.__init__')
-        self.rois_buffer_names = '_roi{0}_buffer'
         try:
             self.init_device()
         except Exception as e:
             self.set_state(DEV_STATE_FAULT)
             self.error_stream('Hardware error in __init__(): %s' % e)
             raise e
-        self.state_machine()
 
     # ------------------------------------------------------------------
     #   Device destructor
     # ------------------------------------------------------------------
     def delete_device(self):
-        self.mythen = None
+        # from now on no thread may (re)connect to the detector
+        self.deleting = True
+        self.poll_stop.set()
+        self.poll_wakeup.set()
+        # stop a running acquisition and wait for its reader and publisher
+        # (and any other action) before closing the connection
+        self.stop_flag = True
+        mythen = self._mythen
+        if mythen is not None and self.cur_state == DEV_STATE_RUNNING:
+            try:
+                mythen.stop()
+            except Exception as e:
+                self.warn_stream('Cannot stop the acquisition: %s' % e)
+        self.executor.shutdown(wait=True)
+        # the poller is blocked at most one detector round trip
+        self.poller.join(max(self.Timeout, 0) + self.STATE_POLL_PERIOD)
+        self._disconnect()
         self.info_stream('In %s::delete_device()' % self.get_name())
 
     # ------------------------------------------------------------------
     #   Device initialization
     # ------------------------------------------------------------------
     def init_device(self):
-        self.info_stream('In %s::init_device()' % self.get_name())
+        self.dev_name = self.get_name()
+        self.info_stream('In %s::init_device()' % self.dev_name)
         self.get_device_properties(self.get_device_class())
         port, scheme = UDP_PORT, "udp"
         if self.Port == 'TCP':
             port, scheme = TCP_PORT, "tcp"
-        url = "{}://{}:{}".format(scheme, self.HostIP, port)
-        self.mythen = Mythen.from_url(url, self.NMod)
+        self.url = "{}://{}:{}".format(scheme, self.HostIP, port)
+        # socket timeout (s) so an unreachable detector never blocks a
+        # request (0 means wait forever)
+        self.timeout = self.Timeout if self.Timeout > 0 else None
+        # the detector is only contacted on the first access to self.mythen
+        # so an unreachable detector doesn't block the server startup
+        self._mythen = None
+        self.deleting = False
+        # only one thread may create the connection (see mythen)
+        self.connect_lock = threading.Lock()
+        self.connect_time = 0
+        self.connect_delay = 0
+        nchannels = self.NMod * Mythen.MAX_CHANNELS
+        self.set_state(DEV_STATE_UNKNOWN)
+        self.set_status('Not connected')
+        # runs the asynchronous actions: acquisition (reader and publisher)
+        # plus a Reset which is allowed while acquiring
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=3, thread_name_prefix='mythen')
         # Initialize attributes
         self.frames_readies = 0
+        # frames pushed in the last NewImageData event (publisher thread only)
+        self.new_frames = slice(0, 0)
         self.live_mode = False
-        self.asynch = False
-        self.raw_data = np.zeros(1280)
-        self.image_data = np.zeros((1, 1280))
+        # set while an asynchronous action owns the device state
+        self.busy = threading.Event()
+        # serializes setting busy with the state updates of the poller so
+        # a stale hardware state never overwrites the one of an action
+        self.state_lock = threading.Lock()
+        # the detector state is polled in a background thread so that
+        # client requests never wait on a detector round trip
+        self.poll_stop = threading.Event()
+        self.poll_wakeup = threading.Event()
+        self.poller = threading.Thread(target=self._poll_state,
+                                       name='mythen-state', daemon=True)
+        # detector parameters only change when written through this device
+        self.cache = {}
+        # RawData before the first frame of an acquisition arrives
+        self.no_data = np.zeros(nchannels, '<i4')
+        self.raw_data = self.no_data
+        # in live mode frames are read into a ring of buffers large enough
+        # to hold the frames being published plus the ones waiting in the
+        # queue (otherwise they are read directly into image_data)
+        nb_buffers = 2 * self.FRAME_QUEUE_SIZE + 2
+        self.frame_buffers = np.empty((nb_buffers, nchannels), '<i4')
+        self.frame_buffer_nb = 0
+        self.image_data = np.zeros((1, nchannels), '<i4')
+        # see Frame attribute
+        self.frame_data = np.zeros(nchannels + 2 * self.NROIs, '<i4')
+        # scratch arrays of the ROI computation (one row per queued frame)
+        self.roi_good = np.empty((self.FRAME_QUEUE_SIZE, nchannels), '<i4')
+        self.roi_cumsum = np.zeros((self.FRAME_QUEUE_SIZE, nchannels + 1),
+                                   'int64')
         self.stop_flag = False
-        self.roi_data = []
-        self.rois = []
-        self.rois_buffer = []
-        for i in range(self.NROIs):
-            data = 0
-            rois = [0, Mythen.MAX_CHANNELS]
-            self.roi_data.append(data)
-            self.rois.append(rois)
-            self.rois_buffer.append(np.zeros(1))
+        self.acq_error = None
+        self.roi_data = np.zeros(self.NROIs, np.uint64)
+        # [low, high) channels of each ROI
+        self.rois = np.zeros((self.NROIs, 2), np.int32)
+        self.rois[:, 1] = Mythen.MAX_CHANNELS
+        self.rois_buffer = np.zeros((self.NROIs, 1), 'int64')
+        # last ROI values sent to the clients (see _changed_rois)
+        self.pushed_rois = np.zeros(self.NROIs, 'int64')
+        # (image data, ROI data) of the last NewImageData/NewROIData event.
+        # A single tuple, rebound by the publisher, so client threads never
+        # see the images of one push with the ROIs of another
+        self.new_data = (self.image_data[:0], self.rois_buffer[:, :0].T)
 
         # Define events on attributes
         self.set_change_event('RawData', True, False)
@@ -227,6 +374,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.set_change_event('IntTime', True, False)
         self.set_change_event('Frames', True, False)
         self.set_change_event('FramesReadies', True, False)
+        self.set_change_event('NewImageData', True, False)
         self.set_change_event('Threshold', True, False)
         self.set_change_event('LiveMode', True, False)
         self.set_change_event('State', True, False)
@@ -237,6 +385,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.set_change_event('OutputHigh', True, False)
         self.set_change_event('InputHigh', True, False)
         self.dyn_attr()
+        self.poller.start()
 
     # ------------------------------------------------------------------
     #   Create dynamic attributes
@@ -246,8 +395,13 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         attr_roihigh_name = 'ROI{0}High'
         attr_roidata_name = 'ROI{0}Data'
         attr_roibuffer_name = 'ROI{0}Buffer'
+        # ROI index of each dynamic ROI attribute name
+        self.roi_index = {}
 
         for roi in range(1, self.NROIs+1):
+            for name in (attr_roilow_name, attr_roihigh_name,
+                         attr_roidata_name, attr_roibuffer_name):
+                self.roi_index[name.format(roi)] = roi - 1
             # ROI result
             attr_roidata = PyTango.Attr(attr_roidata_name.format(roi),
                                         PyTango.ArgType.DevULong64,
@@ -295,30 +449,160 @@ class MythenDCSDevice(PyTango.Device_4Impl):
             self.set_change_event(attr_roihigh_name.format(roi), True, False)
             self.set_change_event(attr_roidata_name.format(roi), True, False)
 
+        # Last frame and its ROI values in a single attribute/event:
+        # [raw data..., ROI1 low, ROI1 high, ROI2 low, ...] where each ROI
+        # value is an int64 split in two int32 (little endian), ie, the
+        # ROI values are frame[nchannels:].view('<i8')
+        attr_frame = PyTango.SpectrumAttr('Frame', PyTango.ArgType.DevLong,
+                                          PyTango.AttrWriteType.READ,
+                                          self.NMod * Mythen.MAX_CHANNELS +
+                                          2 * self.NROIs)
+        self.add_attribute(attr_frame, self.read_Frame, None,
+                           self.is_Frame_allowed)
+        self.set_change_event('Frame', True, False)
+
+        # ROI values of the frames in NewImageData: one row per frame
+        attr_new_roi = PyTango.ImageAttr('NewROIData',
+                                         PyTango.ArgType.DevLong64,
+                                         PyTango.AttrWriteType.READ,
+                                         self.NROIs, 30000)
+        self.add_attribute(attr_new_roi, self.read_NewROIData, None,
+                           self.is_NewROIData_allowed)
+        self.set_change_event('NewROIData', True, False)
+
+    # ------------------------------------------------------------------
+    #   Detector connection
+    # ------------------------------------------------------------------
+    @property
+    def mythen(self):
+        mythen = self._mythen
+        if mythen is None:
+            with self.connect_lock:
+                if self.deleting:
+                    raise MythenError(ERR_MYTHEN_COMM_ERROR)
+                # another thread may have connected in the meantime
+                if self._mythen is None:
+                    self._mythen = self._connect()
+                mythen = self._mythen
+        return mythen
+
+    def _connect(self):
+        # after a failure wait (exponentially longer each time) before
+        # trying again so clients don't block on a dead detector
+        now = time.monotonic()
+        if now < self.connect_time + self.connect_delay:
+            raise MythenError(ERR_MYTHEN_COMM_ERROR)
+        self.connect_time = now
+        try:
+            mythen = Mythen.from_url(self.url, self.NMod,
+                                     rcvbuf=self.SocketRcvBuf,
+                                     timeout=self.timeout)
+        except Exception as e:
+            self.connect_delay = min(max(2 * self.connect_delay,
+                                         self.MIN_CONNECT_DELAY),
+                                     self.MAX_CONNECT_DELAY)
+            self.set_state(DEV_STATE_FAULT)
+            self.set_status('Cannot connect to {}: {}'.format(self.url, e))
+            raise
+        self.connect_delay = 0
+        return mythen
+
+    def _disconnect(self):
+        with self.connect_lock:
+            mythen, self._mythen = self._mythen, None
+        if mythen is not None:
+            mythen.close()
+
     # ------------------------------------------------------------------
     #   State machine implementation
     # ------------------------------------------------------------------
-    @ExceptionHandler
+    def set_state(self, state):
+        # keep a python copy so the is_*_allowed methods, called on every
+        # attribute access, don't have to go through the Tango core
+        self.cur_state = state
+        PyTango.Device_4Impl.set_state(self, state)
+
     def state_machine(self):
-        if self.asynch:
+        if self.busy.is_set():
             return
         status = self.mythen.status
         if status in ['RUNNING', 'WAIT_TRIGGER']:
-            self.set_state(DEV_STATE_RUNNING)
+            state = DEV_STATE_RUNNING
         elif status == 'ON':
-            self.set_state(DEV_STATE_ON)
+            state = DEV_STATE_ON
         else:
-            self.set_state(DEV_STATE_UNKNOWN)
+            state = DEV_STATE_UNKNOWN
+        self._update_state(state, status)
+
+    def _update_state(self, state, status):
+        with self.state_lock:
+            # an action may have started during the detector round trip
+            if self.busy.is_set():
+                return
+            # only notify clients about actual changes
+            if state != self.cur_state:
+                self.set_state(state)
+                self.push_change_event('State')
+            if status != self.get_status():
+                self.set_status(status)
+                self.push_change_event('Status')
+
+    def _poll_state(self):
+        error = None
+        while not self.poll_stop.is_set():
+            try:
+                self.state_machine()
+                error = None
+            except Exception as e:
+                # don't flood the log while the detector is unreachable
+                if str(e) != error:
+                    self.warn_stream('Hardware warning in state_machine: '
+                                     '%s' % e)
+                error = str(e)
+                # a failed connection attempt already reported itself
+                if self._mythen is not None:
+                    self._update_state(DEV_STATE_FAULT,
+                                       'Hardware error: {}'.format(e))
+            self.poll_wakeup.wait(self.STATE_POLL_PERIOD)
+            self.poll_wakeup.clear()
+
+    def _start_action(self, status, func, *args):
+        # flag the device busy before the worker is scheduled so that
+        # state_machine never observes a stale hardware state
+        with self.state_lock:
+            self.busy.set()
+        self.set_state(DEV_STATE_INIT)
         self.set_status(status)
+        self.executor.submit(self._run_action, func, *args)
+
+    def _run_action(self, func, *args):
+        try:
+            func(*args)
+        finally:
+            self.busy.clear()
+            # the hardware state may have changed: query it now
+            self.poll_wakeup.set()
+
+    def _cached(self, name):
+        try:
+            return self.cache[name]
+        except KeyError:
+            value = self.cache[name] = getattr(self.mythen, name)
+            return value
+
+    def _invalidate(self, name):
+        self.cache.pop(name, None)
+        for impacted in self.CACHE_IMPACT.get(name, ()):
+            self.cache.pop(impacted, None)
 
     # ------------------------------------------------------------------
     #   Always executed hook method
     # ------------------------------------------------------------------
     def always_executed_hook(self):
-        self.info_stream('In %s::always_executed_hook()' % self.get_name())
-        self.state_machine()
-        self.push_change_event('State')
-        self.push_change_event('Status')
+        # runs before every attribute access and command: only trace it at
+        # debug level
+        if self.get_logger().is_debug_enabled():
+            self.debug_stream('In %s::always_executed_hook()' % self.dev_name)
 
     # ------------------------------------------------------------------
     #   ATTRIBUTES
@@ -331,97 +615,63 @@ class MythenDCSDevice(PyTango.Device_4Impl):
     # ------------------------------------------------------------------
     @ExceptionHandler
     def read_Version(self, the_att):
-        the_att.set_value(self.mythen.version)
+        the_att.set_value(self._cached('version'))
 
     def is_Version_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write  ReadoutBits attribute
     # ------------------------------------------------------------------
-    @ExceptionHandler
-    def read_ReadoutBits(self, the_att):
-        the_att.set_value(self.mythen.readoutbits)
-
-    @ExceptionHandler
-    def write_ReadoutBits(self, the_att):
-        data = []
-        the_att.get_write_value(data)
-        if data[0] not in COUNTER_BITS:
-            raise ValueError('Invalid value. %s' % repr(COUNTER_BITS))
-        self.mythen.readoutbits = data[0]
-        self.push_change_event('ReadoutBits', data[0])
+    read_ReadoutBits, write_ReadoutBits = parameter_attribute(
+        'readoutbits', 'ReadoutBits', COUNTER_BITS)
 
     def is_ReadoutBits_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write RateCorrection attribute
     # ------------------------------------------------------------------
-    @ExceptionHandler
-    def read_RateCorrection(self, the_att):
-        the_att.set_value(self.mythen.rate)
-
-    @ExceptionHandler
-    def write_RateCorrection(self, the_att):
-        data = []
-        the_att.get_write_value(data)
-        self.mythen.rate = data[0]
-        self.push_change_event('RateCorrection', data[0])
+    read_RateCorrection, write_RateCorrection = parameter_attribute(
+        'rate', 'RateCorrection')
 
     def is_RateCorrection_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write FlatFieldCorrection attribute
     # ------------------------------------------------------------------
-    @ExceptionHandler
-    def read_FlatFieldCorrection(self, the_att):
-        the_att.set_value(self.mythen.flatfield)
-
-    @ExceptionHandler
-    def write_FlatFieldCorrection(self, the_att):
-        data = []
-        the_att.get_write_value(data)
-        self.mythen.flatfield = data[0]
-        self.push_change_event('FlatFieldCorrection', data[0])
+    read_FlatFieldCorrection, write_FlatFieldCorrection = parameter_attribute(
+        'flatfield', 'FlatFieldCorrection')
 
     def is_FlatFieldCorrection_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write BadChnInterp attribute
     # ------------------------------------------------------------------
-    @ExceptionHandler
-    def read_BadChnInterp(self, the_att):
-        the_att.set_value(self.mythen.badchnintrpl)
-
-    @ExceptionHandler
-    def write_BadChnInterp(self, the_att):
-        data = []
-        the_att.get_write_value(data)
-        self.mythen.badchnintrpl = data[0]
-        self.push_change_event('BadChnInterp', data[0])
+    read_BadChnInterp, write_BadChnInterp = parameter_attribute(
+        'badchnintrpl', 'BadChnInterp')
 
     def is_BadChnInterp_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read Settings attribute
     # ------------------------------------------------------------------
     @ExceptionHandler
     def read_Settings(self, the_att):
-        the_att.set_value(self.mythen.settings)
+        the_att.set_value(self._cached('settings'))
 
     def is_Settings_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write SettingsMode attribute
     # ------------------------------------------------------------------
     @ExceptionHandler
     def read_SettingsMode(self, the_att):
-        the_att.set_value(self.mythen.settingsmode)
+        the_att.set_value(self._cached('settingsmode'))
 
     @ExceptionHandler
     def write_SettingsMode(self, the_att):
@@ -430,56 +680,34 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         if data[0] not in SETTINGS_MODES:
             raise ValueError('Invalid value. %s' % repr(SETTINGS_MODES))
 
-        self.asynch = True
-        self.set_state(DEV_STATE_INIT)
-        self.set_status('Configuring....')
-        t = threading.Thread(target=self._setting_mode, args=[data[0]])
-        t.start()
+        self._start_action('Configuring....', self._setting_mode, data[0])
 
     def _setting_mode(self, value):
         self.mythen.settingsmode = value
+        self._invalidate('settingsmode')
         settings = self.mythen.settings
         self.push_change_event('Settings', settings)
         self.push_change_event('SettingsMode', value)
         self.set_state(DEV_STATE_ON)
-        self.asynch = False
 
     def is_SettingsMode_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write Tau attribute
     # ------------------------------------------------------------------
-    @ExceptionHandler
-    def read_Tau(self, the_att):
-        the_att.set_value(self.mythen.tau)
-
-    @ExceptionHandler
-    def write_Tau(self, the_att):
-        data = []
-        the_att.get_write_value(data)
-        self.mythen.tau = data[0]
-        self.push_change_event('Tau', data[0])
+    read_Tau, write_Tau = parameter_attribute('tau', 'Tau')
 
     def is_Tau_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write IntTime attribute
     # ------------------------------------------------------------------
-    @ExceptionHandler
-    def read_IntTime(self, the_att):
-        the_att.set_value(self.mythen.inttime)
-
-    @ExceptionHandler
-    def write_IntTime(self, the_att):
-        data = []
-        the_att.get_write_value(data)
-        self.mythen.inttime = data[0]
-        self.push_change_event('IntTime', data[0])
+    read_IntTime, write_IntTime = parameter_attribute('inttime', 'IntTime')
 
     def is_Time_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write Frames attribute
@@ -496,7 +724,24 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.push_change_event('Frames', data[0])
 
     def is_Frames_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
+
+    # ------------------------------------------------------------------
+    #   read Frame attribute
+    # ------------------------------------------------------------------
+    @ExceptionHandler
+    def read_Frame(self, the_att):
+        the_att.set_value(self._build_frame())
+
+    def is_Frame_allowed(self, req_type):
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
+
+    def _build_frame(self):
+        nchannels = len(self.raw_data)
+        frame = self.frame_data[:nchannels + 2 * self.NROIs]
+        frame[:nchannels] = self.raw_data
+        frame[nchannels:].view('<i8')[:] = self.roi_data
+        return frame
 
     # ------------------------------------------------------------------
     #   read RawData attribute
@@ -506,7 +751,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         the_att.set_value(self.raw_data)
 
     def is_LastRaw_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
 
     # ------------------------------------------------------------------
     #   read & write LiveMode attribute
@@ -523,7 +768,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.push_change_event('LiveMode', data[0])
 
     def is_LiveMode_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
 
     # ------------------------------------------------------------------
     #   read & write TriggerMode attribute
@@ -540,7 +785,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.push_change_event('TriggerMode', data[0])
 
     def is_TriggerMode_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write ContinuousTrigger attribute
@@ -557,7 +802,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.push_change_event('ContinuousTrigger', data[0])
 
     def is_ContinuousTrigger_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write GateMode attribute
@@ -574,7 +819,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.push_change_event('GateMode', data[0])
 
     def is_GateMode_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write OutputHigh attribute
@@ -591,7 +836,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.push_change_event('OutputHigh', data[0])
 
     def is_OutputHigh_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write InputHigh attribute
@@ -608,7 +853,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         self.push_change_event('InputHigh', data[0])
 
     def is_InputHigh_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write ROILow attribute
@@ -616,22 +861,22 @@ class MythenDCSDevice(PyTango.Device_4Impl):
     # @ExceptionHandler
     def read_ROILow(self, the_att):
         attr_name = the_att.get_name()
-        nroi = int(attr_name[3]) - 1
-        the_att.set_value(self.rois[nroi][0])
+        nroi = self.roi_index[attr_name]
+        the_att.set_value(int(self.rois[nroi, 0]))
 
     # @ExceptionHandler
     def write_ROILow(self, the_att):
         data = []
         attr_name = the_att.get_name()
-        nroi = int(attr_name[3]) - 1
+        nroi = self.roi_index[attr_name]
         the_att.get_write_value(data)
-        if data[0] >= self.rois[nroi][1]:
+        if data[0] >= self.rois[nroi, 1]:
             raise ValueError('The value should be lower than the ROIHigh.')
-        self.rois[nroi][0] = data[0]
+        self.rois[nroi, 0] = data[0]
         self.push_change_event(attr_name, data[0])
 
     def is_ROILow_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read & write ROILow attribute
@@ -639,22 +884,22 @@ class MythenDCSDevice(PyTango.Device_4Impl):
     # @ExceptionHandler
     def read_ROIHigh(self, the_att):
         attr_name = the_att.get_name()
-        nroi = int(attr_name[3]) - 1
-        the_att.set_value(self.rois[nroi][1])
+        nroi = self.roi_index[attr_name]
+        the_att.set_value(int(self.rois[nroi, 1]))
 
     # @ExceptionHandler
     def write_ROIHigh(self, the_att):
         data = []
         the_att.get_write_value(data)
         attr_name = the_att.get_name()
-        nroi = int(attr_name[3]) - 1
-        if data[0] <= self.rois[nroi][0]:
+        nroi = self.roi_index[attr_name]
+        if data[0] <= self.rois[nroi, 0]:
             raise ValueError('The value should be greater than the ROILow.')
-        self.rois[nroi][1] = data[0]
+        self.rois[nroi, 1] = data[0]
         self.push_change_event(attr_name, data[0])
 
     def is_ROIHigh_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read ROIData attribute
@@ -662,39 +907,31 @@ class MythenDCSDevice(PyTango.Device_4Impl):
     # @ExceptionHandler
     def read_ROIData(self, the_att):
         attr_name = the_att.get_name()
-        nroi = int(attr_name[3]) - 1
+        nroi = self.roi_index[attr_name]
         the_att.set_value(self.roi_data[nroi])
 
     def is_ROIData_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
 
     # ------------------------------------------------------------------
     #   read ROIData attribute
     # ------------------------------------------------------------------
     def read_ROIBuffer(self, the_att):
         attr_name = the_att.get_name()
-        nroi = int(attr_name[3]) - 1
+        nroi = self.roi_index[attr_name]
         the_att.set_value(self.rois_buffer[nroi][:self.frames_readies])
 
     def is_ROIBuffer_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
 
     # ------------------------------------------------------------------
     #   read & write Threshold attribute
     # ------------------------------------------------------------------
-    @ExceptionHandler
-    def read_Threshold(self, the_att):
-        the_att.set_value(self.mythen.threshold)
-
-    @ExceptionHandler
-    def write_Threshold(self, the_att):
-        data = []
-        the_att.get_write_value(data)
-        self.mythen.threshold = data[0]
-        self.push_change_event('Threshold', data[0])
+    read_Threshold, write_Threshold = parameter_attribute(
+        'threshold', 'Threshold')
 
     def is_Threshold_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     # ------------------------------------------------------------------
     #   read Image attribute
@@ -704,7 +941,26 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         the_att.set_value(self.image_data[:self.frames_readies])
 
     def is_ImageData_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
+
+    # ------------------------------------------------------------------
+    #   read NewImageData & NewROIData attributes
+    # ------------------------------------------------------------------
+    @ExceptionHandler
+    def read_NewImageData(self, the_att):
+        images, _ = self.new_data
+        the_att.set_value(images)
+
+    def is_NewImageData_allowed(self, req_type):
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
+
+    @ExceptionHandler
+    def read_NewROIData(self, the_att):
+        _, rois = self.new_data
+        the_att.set_value(rois)
+
+    def is_NewROIData_allowed(self, req_type):
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
 
     # ------------------------------------------------------------------
     #   read FramesReadies attribute
@@ -714,7 +970,7 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         the_att.set_value(self.frames_readies)
 
     def is_FramesReadies_allowed(self, req_type):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
 
     # ------------------------------------------------------------------
     #   COMMANDS
@@ -724,171 +980,345 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         # Take the bad channels
         return self.mythen.badchn
 
-    @ExceptionHandler
-    def _roi2mask(self, nroi, mask):
-        new_mask = np.array(mask)
-        min_roi, max_roi = self.rois[nroi]
-        new_mask[:min_roi] = 1
-        new_mask[max_roi:] = 1
-        return new_mask
-
     @ExceptionHandler
     def Stop(self):
         self.stop_flag = True
         self.mythen.stop()
 
     def is_Stop_allowed(self):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING,)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING,)
 
     @ExceptionHandler
     def Start(self):
-        self.raw_data = None
+        self.raw_data = self.no_data
         self.stop_flag = False
-        self.asynch = True
-        if self.live_mode:
-            self.mythen.frames = 1
-            self.mythen.triggermode = False
-            self.mythen.continuoustrigger = False
-            self.push_change_event('Frames', 1)
-            self.push_change_event('TriggerMode', False)
-            self.push_change_event('ContinuousTrigger', False)
-
-
-        hw_mask = self._get_hwmask()
-        self.masks = []
-        self.image_data = np.zeros((self.mythen.frames, 1280))
-        self.frames_readies = 0
-        for roi in range(self.NROIs):
-            self.masks.append(self._roi2mask(roi, hw_mask))
-            self.rois_buffer[roi] = np.zeros(self.mythen.frames, 'int64')
+        with self.state_lock:
+            self.busy.set()
+        try:
+            if self.live_mode:
+                self.mythen.frames = 1
+                self.mythen.triggermode = False
+                self.mythen.continuoustrigger = False
+                self.push_change_event('Frames', 1)
+                self.push_change_event('TriggerMode', False)
+                self.push_change_event('ContinuousTrigger', False)
+
+            nchannels = self.mythen.nchannels
+            # 1 for the channels contributing to the ROIs, 0 for the bad ones
+            # (uint8, not bool: it is used as a multiplier in _calc_rois)
+            self.good_channels = (self._get_hwmask() == 0).view(np.uint8)
+            # reuse the buffers of the previous acquisition when possible: only
+            # the first frames_readies frames are ever read from them
+            frames = self.mythen.frames
+            if self.image_data.shape != (frames, nchannels):
+                self.image_data = np.zeros((frames, nchannels), '<i4')
+                self.rois_buffer = np.zeros((self.NROIs, frames), 'int64')
+            self.frames_readies = 0
+            self.frame_buffer_nb = 0
+            # unexpected error of the reader or publisher (see _acq_end)
+            self.acq_error = None
+            self.new_frames = slice(0, 0)
+            self.new_data = (self.image_data[:0], self.rois_buffer[:, :0].T)
+            # the ROI thresholds apply from the first frame of each acquisition
+            self.pushed_rois[:] = 0
+            # ROI i sum is roi_cumsum[roi_high[i]] - roi_cumsum[roi_low[i]]
+            self.roi_low, self.roi_high = np.clip(self.rois, 0, nchannels).T
+            # a readout only answers once the frame (exposure plus delay after
+            # frame) is over. Triggers and gates may keep it waiting for any
+            # time so it is not timed out then
+            triggermode = self.mythen.triggermode
+            self.readout_timeout = None
+            if self.timeout is not None and not triggermode and \
+                    not self.mythen.gatemode:
+                self.readout_timeout = self._cached('inttime') + \
+                    self.mythen.delay_frame + self.timeout
 
-        if self.live_mode:
-            method = self._livemode
-            self.set_status('Live Mode')
-        else:
-            if not self.mythen.triggermode:
-                method = self._frame_acq
-                self.set_status('Acquisition Mode: Internal Trigger')
+            if self.live_mode:
+                method = self._livemode
+                self.set_status('Live Mode')
             else:
-                method = self._multiframes_acq
-                self.set_status('Acquisition Mode: External Trigger')
-            self.mythen.start()
-        t = threading.Thread(target=method)
-        t.start()
+                if not triggermode:
+                    method = self._frame_acq
+                    self.set_status('Acquisition Mode: Internal Trigger')
+                else:
+                    method = self._multiframes_acq
+                    self.set_status('Acquisition Mode: External Trigger')
+                self.mythen.start()
+            # the acquisition thread reads frames from the detector and the
+            # publisher thread stores them and pushes the events
+            self.frame_queue = queue.Queue(self.FRAME_QUEUE_SIZE)
+            self.executor.submit(self._publish_frames)
+            self.executor.submit(self._run_acq, method)
+        except Exception as e:
+            # without busy cleared the poller would never update the state
+            self.set_state(DEV_STATE_FAULT)
+            self.set_status('Cannot start: {}'.format(e))
+            self.busy.clear()
+            self.poll_wakeup.set()
+            raise
         self.set_state(DEV_STATE_RUNNING)
         self.push_change_event('State')
         self.push_change_event('Status')
 
     def _acq(self):
-        self.raw_data = self.mythen.readout
-        self.push_change_event('RawData', self.raw_data)
-        frame = self.frames_readies
         if self.live_mode:
-            frame = 0
-        self.image_data[frame] = self.raw_data
-        self._calc_rois()
-        self.frames_readies += 1
+            buffers = self.frame_buffers
+            buff = buffers[self.frame_buffer_nb % len(buffers)]
+        else:
+            # read straight into the frame's final place
+            buff = self.image_data[self.frame_buffer_nb]
+        self.frame_buffer_nb += 1
+        self.frame_queue.put(self.mythen.readout_into(
+            buff, timeout=self.readout_timeout))
+
+    def _acq_done(self):
+        return self.stop_flag or self.frame_buffer_nb >= len(self.image_data)
+
+    def _store_frames(self, frames):
+        nb_frames = len(frames)
+        first = self.frames_readies
+        if self.live_mode:
+            # only the latest frame is kept
+            first = 0
+            self.image_data[0] = frames[-1]
+        # otherwise the frames were read in place (see _acq)
+        last = first + (1 if self.live_mode else nb_frames)
+        self.raw_data = self.image_data[last - 1]
+        self._calc_rois(first, last)
+        self.frames_readies += nb_frames
+
+    def _calc_rois(self, first, last):
+        # sum all ROIs of all frames at once: cumulative sum of the good
+        # channels of each (contiguous int32) frame
+        nb_frames = last - first
+        good, cumsum = self.roi_good[:nb_frames], self.roi_cumsum[:nb_frames]
+        np.multiply(self.image_data[first:last], self.good_channels, out=good)
+        np.cumsum(good, axis=1, dtype=np.int64, out=cumsum[:, 1:])
+        roi_values = cumsum[:, self.roi_high] - cumsum[:, self.roi_low]
+        self.rois_buffer[:, first:last] = roi_values.T
+        self.roi_data[:] = roi_values[-1]
+
+    def _push_frame(self, final=False):
+        # Tango only serializes the events of the attributes with
+        # subscribers: clients should subscribe either to Frame or to
+        # RawData + ROI<n>Data
+        self.push_change_event('Frame', self._build_frame())
+        self.push_change_event('RawData', self.raw_data)
+        self._push_rois(force=final)
         self.push_change_event('FramesReadies', self.frames_readies)
-
-    def _calc_rois(self):
-        data_masked = np.ma.MaskedArray(self.raw_data)
-        for roi_nr in range(self.NROIs):
-            data_masked.mask = self.masks[roi_nr]
-            roi_value = np.uint64(data_masked.sum())
-            self.roi_data[roi_nr] = roi_value
-            frame = self.frames_readies
-            if self.live_mode:
-                frame = 0
-            self.rois_buffer[roi_nr][frame] = roi_value
+        # all the frames stored since the previous push in a single event
+        if self.live_mode:
+            self.new_frames = slice(0, 1)
+        else:
+            self.new_frames = slice(self.new_frames.stop, self.frames_readies)
+        new_data = (self.image_data[self.new_frames],
+                    self.rois_buffer[:, self.new_frames].T)
+        self.new_data = new_data
+        self.push_change_event('NewImageData', new_data[0])
+        self.push_change_event('NewROIData', new_data[1])
+
+    def _push_rois(self, force=False):
+        # force: push all the ROIs, whatever the thresholds (the clients
+        # must end up with the final values)
+        for roi_nr in self._changed_rois(force):
             attr_name = 'ROI%dData' % (roi_nr + 1)
             self.push_change_event(attr_name, self.roi_data[roi_nr])
 
+    def _changed_rois(self, force=False):
+        # ROIs which changed more than the thresholds since their last push
+        values = self.roi_data.astype(np.int64)
+        pushed = self.pushed_rois
+        if not force and (self.ROIAbsThreshold or self.ROIRelThreshold):
+            delta = np.abs(values - pushed)
+            changed = np.zeros(self.NROIs, dtype=bool)
+            if self.ROIAbsThreshold:
+                changed |= delta > self.ROIAbsThreshold
+            if self.ROIRelThreshold:
+                changed |= delta > self.ROIRelThreshold * np.abs(pushed)
+            rois = np.flatnonzero(changed)
+        else:
+            rois = range(self.NROIs)
+        pushed[rois] = values[rois]
+        return rois
+
+    def _publish_frames(self):
+        frame_queue = self.frame_queue
+        push_period = 1 / self.EventRateHz if self.EventRateHz > 0 else 0
+        last_push, pending = 0, False
+        finished = False
+        try:
+            while not finished:
+                frames = [frame_queue.get()]
+                # frames which arrived in the meantime are all stored but
+                # only the latest one is pushed to the clients
+                # (at most FRAME_QUEUE_SIZE so the frame buffers in use are
+                # not reused by the acquisition thread)
+                while frames[-1] is not None and not frame_queue.empty() \
+                        and len(frames) < self.FRAME_QUEUE_SIZE:
+                    frames.append(frame_queue.get())
+                finished = frames[-1] is None
+                if finished:
+                    frames.pop()
+                if frames:
+                    self._store_frames(frames)
+                pending = pending or bool(frames)
+                # limit the event rate but always push the last frame
+                now = time.monotonic()
+                if pending and (finished or now - last_push >= push_period):
+                    self._push_frame(final=finished)
+                    last_push, pending = now, False
+                elif finished and self.frames_readies:
+                    # the last frame was already pushed, maybe without some
+                    # of its ROIs
+                    self._push_rois(force=True)
+        except Exception as e:
+            self.error_stream('Error publishing frames: %s' % e)
+            self.acq_error = e
+            if not finished:
+                # make the acquisition thread finish: it must not block on
+                # the full queue
+                self.stop_flag = True
+                try:
+                    self.mythen.stop()
+                except Exception:
+                    pass
+                while frame_queue.get() is not None:
+                    pass
+        finally:
+            self._acq_end()
+
     def _acq_end(self):
-        self.set_state(DEV_STATE_ON)
-        self.set_status('ON')
+        if self.acq_error is None:
+            self.set_state(DEV_STATE_ON)
+            self.set_status('ON')
+        else:
+            self.set_state(DEV_STATE_FAULT)
+            self.set_status('Acquisition error: {}'.format(self.acq_error))
         self.push_change_event('State')
         self.push_change_event('Status')
-        self.asynch = False
+        self.busy.clear()
 
-    def _multiframes_acq(self):
-        while True:
-            while self.mythen.fifoempty and self.mythen.running:
-                time.sleep(0.1)
+    def _run_acq(self, method):
+        # the thread reading the frames is the one which has to keep up
+        # with the detector
+        try:
+            with self._acq_scheduling():
+                method()
+        except Exception as e:
+            # the methods only handle MythenError: anything else would be
+            # lost in the executor future
+            self.error_stream('Error reading frames: %s' % e)
+            self.acq_error = e
+
+    @contextlib.contextmanager
+    def _acq_scheduling(self):
+        # best effort (linux only, needs CAP_SYS_NICE for the priority).
+        # The pool thread is restored afterwards since it is reused
+        restore = []
+        if self.AcqPriority > 0 and hasattr(os, 'sched_setscheduler'):
             try:
-                self._acq()
-            except MythenError:
-                break
-        self._acq_end()
+                policy, param = os.sched_getscheduler(0), os.sched_getparam(0)
+                os.sched_setscheduler(0, os.SCHED_FIFO,
+                                      os.sched_param(self.AcqPriority))
+                restore.append(lambda: os.sched_setscheduler(0, policy, param))
+            except OSError as e:
+                self.warn_stream('Cannot raise acquisition priority: %s' % e)
+        if self.AcqCPU >= 0 and hasattr(os, 'sched_setaffinity'):
+            try:
+                cpus = os.sched_getaffinity(0)
+                os.sched_setaffinity(0, {self.AcqCPU})
+                restore.append(lambda: os.sched_setaffinity(0, cpus))
+            except OSError as e:
+                self.warn_stream('Cannot pin acquisition thread: %s' % e)
+        try:
+            yield
+        finally:
+            for func in restore:
+                try:
+                    func()
+                except OSError:
+                    pass
+
+    def _multiframes_acq(self):
+        try:
+            while not self._acq_done():
+                self._wait_frame()
+                try:
+                    self._acq()
+                except MythenError:
+                    break
+        finally:
+            self.frame_queue.put(None)
+
+    def _wait_frame(self):
+        # a readout blocks until the next trigger holding the connection
+        # (so Stop couldn't get through): wait for the detector to have a
+        # frame (or to finish) polling its status with an increasing period
+        mythen = self.mythen
+        wait_mask = mythen.MASK_FIFO_EMPTY | mythen.MASK_RUNNING
+        period = self.MIN_POLL_PERIOD
+        while mythen.raw_status & wait_mask == wait_mask:
+            time.sleep(period)
+            period = min(2 * period, self.MAX_POLL_PERIOD)
 
     def _frame_acq(self):
-        while True:
-            try:
-                self._acq()
-            except MythenError:
-                break
-        self._acq_end()
+        try:
+            while not self._acq_done():
+                try:
+                    self._acq()
+                except MythenError:
+                    break
+        finally:
+            self.frame_queue.put(None)
 
     def _livemode(self):
-        while not self.stop_flag:
-            try:
-                self.mythen.start()
-                self._acq()
-            except MythenError:
-                break
-        self._acq_end()
+        try:
+            while not self.stop_flag:
+                try:
+                    self.mythen.start()
+                    self._acq()
+                except MythenError:
+                    break
+        finally:
+            self.frame_queue.put(None)
 
     def is_Start_allowed(self):
-        return self.get_state() in (DEV_STATE_ON,)
+        return self.cur_state in (DEV_STATE_ON,)
 
     @ExceptionHandler
     def Reset(self):
-        self.asynch = True
-        self.set_state(DEV_STATE_INIT)
-        self.set_status('Resetting....')
+        self._start_action('Resetting....', self._reset)
         self.push_change_event('State')
         self.push_change_event('Status')
-        t = threading.Thread(target=self._reset)
-        t.start()
 
     def _reset(self):
         self.mythen.reset()
-        self.push_change_event('ReadoutBits', self.mythen.readoutbits)
-        self.push_change_event('RateCorrection', self.mythen.rate)
-        self.push_change_event('FlatFieldCorrection', self.mythen.flatfield)
-        self.push_change_event('BadChnInterp', self.mythen.badchnintrpl)
-        self.push_change_event('Settings', self.mythen.settings)
-        self.push_change_event('SettingsMode', self.mythen.settingsmode)
-        self.push_change_event('Tau', self.mythen.tau)
-        self.push_change_event('IntTime', self.mythen.inttime)
+        self.cache.clear()
+        # refill the cache so the clients reading back after the events
+        # don't query the detector again
+        for attr_name, param in self.RESET_EVENTS:
+            self.push_change_event(attr_name, self._cached(param))
         self.push_change_event('Frames', self.mythen.frames)
-        self.push_change_event('Threshold', self.mythen.threshold)
         self.push_change_event('LiveMode', self.live_mode)
         self.set_state(DEV_STATE_ON)
         self.set_status('ON')
         self.push_change_event('State')
         self.push_change_event('Status')
-        self.asynch = False
 
     def is_Reset_allowed(self):
-        return self.get_state() in (DEV_STATE_RUNNING, DEV_STATE_FAULT,
-                                    DEV_STATE_UNKNOWN, DEV_STATE_ON)
+        return self.cur_state in (DEV_STATE_RUNNING, DEV_STATE_FAULT,
+                                  DEV_STATE_UNKNOWN, DEV_STATE_ON)
 
     @ExceptionHandler
     def AutoSettings(self, value):
-        self.asynch = True
-        self.set_state(DEV_STATE_INIT)
-        self.set_status('Configuring....')
-        t = threading.Thread(target=self._autosettings, args=[value])
-        t.start()
+        self._start_action('Configuring....', self._autosettings, value)
 
     def _autosettings(self, value):
         self.mythen.autosettings(value)
-        settings = self.mythen.settings
-        settings_mode = self.mythen.settingsmode
-        self.push_change_event('Settings', settings)
-        self.push_change_event('SettingsMode', settings_mode)
+        self.cache.clear()
+        self.push_change_event('Settings', self._cached('settings'))
+        self.push_change_event('SettingsMode', self._cached('settingsmode'))
         self.set_state(DEV_STATE_ON)
-        self.asynch = False
 
     @ExceptionHandler
     def GetROIBuffer(self, value):
@@ -903,12 +1333,28 @@ class MythenDCSDevice(PyTango.Device_4Impl):
         return data
 
     def is_GetROIBuffer_allowed(self):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
 
     @ExceptionHandler
     def GetRawBuffer(self, value):
         frame = int(value)
-        return json.dumps(self.image_data[frame:].tolist())
+        # image_data is reused: rows past frames_readies are stale
+        data = self.image_data[frame:self.frames_readies]
+        return json.dumps(data.tolist())
 
     def is_GetRawBuffer_allowed(self):
-        return self.get_state() in (DEV_STATE_ON, DEV_STATE_RUNNING)
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_RUNNING)
+
+    @ExceptionHandler
+    def Reconnect(self):
+        self._disconnect()
+        self.connect_delay = 0
+        self.cache.clear()
+        self.busy.clear()
+        self.set_state(DEV_STATE_UNKNOWN)
+        self.set_status('Not connected')
+        self.poll_wakeup.set()
+
+    def is_Reconnect_allowed(self):
+        return self.cur_state in (DEV_STATE_ON, DEV_STATE_FAULT,
+                                  DEV_STATE_UNKNOWN)
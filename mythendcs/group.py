@@ -1,4 +1,5 @@
-import select
+import itertools
+import functools
 import concurrent.futures
 
 import numpy as np
@@ -33,12 +34,14 @@ class ChainGroup:
     CONCAT_GET = {
         "num_module_channels", "energy", "threshold", "tau", "badchn",
         "module_high_voltages", "module_temperatures", "module_humidities",
-        "module_serial_numbers", "module_firmware_versions",
-        "module_sensor_materials", "module_sensor_thicknesses",
+        "module_serial_numbers", "module_sensor_thicknesses",
         "module_sensor_widths", "test_pattern",
         "min_energy", "max_energy", "min_threshold", "max_threshold"
     }
 
+    # like CONCAT_GET but for attributes which are lists of strings
+    LIST_GET = {"module_firmware_versions", "module_sensor_materials"}
+
     def __init__(self, master, *slaves, executor=None):
         mythens = (master,) + slaves
         members = dict(
@@ -63,10 +66,10 @@ class ChainGroup:
         if name in self.JOIN_GET:
             return self._map(getattr, (name,))
         elif name in self.CONCAT_GET:
+            return np.concatenate(self._map(getattr, (name,)))
+        elif name in self.LIST_GET:
             results = self._map(getattr, (name,))
-            if isinstance(results[0], str):
-                return [item for items in results for item in items]
-            return np.concatenate(results)
+            return [item for items in results for item in items]
         else:
             return getattr(self.mythen_master, name)
 
@@ -79,13 +82,10 @@ class ChainGroup:
     def _map(self, func, args=(), kwargs=None, mythens=None):
         if mythens is None:
             mythens = self.mythens
-        if kwargs is None:
-            kwargs = {}
-        futures = [
-            self._exec.submit(func, mythen, *args, **kwargs)
-            for mythen in mythens
-        ]
-        return [future.result() for future in futures]
+        if kwargs:
+            func = functools.partial(func, **kwargs)
+        args = (itertools.repeat(arg) for arg in args)
+        return list(self._exec.map(func, mythens, *args))
 
     def start(self):
         slaves = reversed(self.mythen_slaves)
@@ -116,11 +116,15 @@ class ChainGroup:
 
     @flatfieldconf.setter
     def flatfieldconf(self, value):
-        offset = 0
-        for mythen in self.mythens:
-            end = offset + mythen.num_channels
-            mythen.flatfieldconf = value[offset:end]
-            offset = end
+        # offsets are not cached: they change with active_modules
+        offsets = np.cumsum([mythen.num_channels for mythen in self.mythens])
+        chunks = np.split(np.asarray(value), offsets[:-1])
+        futures = [
+            self._exec.submit(setattr, mythen, "flatfieldconf", chunk)
+            for mythen, chunk in zip(self.mythens, chunks)
+        ]
+        for future in futures:
+            future.result()
 
     def readout(self, buff=None):
         if buff is None:
@@ -147,62 +151,43 @@ class ChainGroup:
                 n = buff_nb_frames
             else:
                 assert n <= buff_nb_frames
-        flat = buff[:]
-        flat.shape = flat.size
-
-        connections = {}
-        offset = 0
-        for mythen in self.mythens:
-            num_channels = mythen.num_channels
-            connections[mythen.connection] = mythen, offset, num_channels
-            offset += num_channels
+        # one row per frame, whatever the shape of the given buffer (which
+        # must be contiguous: reshape would read into a copy otherwise)
+        assert buff.flags.c_contiguous
+        frames = buff.reshape(-1)[:n * frame_channels].reshape(n, -1)
+        connections = self._start_readout(n)
+        for frame in frames:
+            self._read_frame_into(connections, frame)
+            yield frame
 
-        write = type(self.mythen_master.connection).write
-        cmd = ('-readout' if n == 1 else '-readout {}'.format(n)).encode()
-        results = [
-            self._exec.submit(write, connection, cmd)
-            for connection in connections
-        ]
-        concurrent.futures.wait(results)
+    def gen_readout(self, n, buffers):
+        connections = self._start_readout(n)
         for i in range(n):
-            frame_offset = i * frame_channels
-            frame  = flat[frame_offset:frame_offset + frame_channels]
-            conns = set(connections)
-            while conns:
-                ready, _, _ = select.select(conns, (), ())
-                for conn in ready:
-                    mythen, offset, num_channels = connections[conn]
-                    frame_view = frame[offset:offset + num_channels]
-                    conn.read_exactly_into(frame_view)
-                    conns.remove(conn)
+            frame = next(buffers)
+            self._read_frame_into(connections, frame)
             yield frame
 
-    def gen_readout(self, n, buffers):
+    def _start_readout(self, n):
         connections = {}
         offset = 0
         for mythen in self.mythens:
             num_channels = mythen.num_channels
             connections[mythen.connection] = mythen, offset, num_channels
             offset += num_channels
-
-        write = type(self.mythen_master.connection).write
-        cmd = ('-readout' if n == 1 else '-readout {}'.format(n)).encode()
-        results = [
-            self._exec.submit(write, connection, cmd)
-            for connection in connections
-        ]
-        concurrent.futures.wait(results)
-        for i in range(n):
-            frame = next(buffers)
-            conns = set(connections)
-            while conns:
-                ready, _, _ = select.select(conns, (), ())
-                for conn in ready:
-                    mythen, offset, num_channels = connections[conn]
-                    frame_view = frame[offset:offset + num_channels]
-                    conn.read_exactly_into(frame_view)
-                    conns.remove(conn)
-            yield frame
+        cmd = b'-readout' if n == 1 else b'-readout %d' % n
+        # a plain send per mythen: not worth a round trip through the pool
+        for connection in connections:
+            connection.write(cmd)
+        return connections
+
+    @staticmethod
+    def _read_frame_into(connections, frame):
+        # A frame is only complete when the part of every mythen arrived so
+        # reading the parts in a fixed order with blocking reads doesn't
+        # delay it compared to reading whichever is ready first (the others
+        # wait in the socket buffers) and needs no select call per frame
+        for conn, (mythen, offset, num_channels) in connections.items():
+            conn.read_exactly_into(frame[offset:offset + num_channels])
 
     def __repr__(self):
         return mythen_repr(self)
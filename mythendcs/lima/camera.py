@@ -1,5 +1,7 @@
+import os
 import time
 import logging
+import itertools
 import threading
 
 import numpy
@@ -16,6 +18,11 @@ from ..group import ChainGroup
 
 Status = HwInterface.StatusType
 
+log = logging.getLogger(__name__)
+
+# numpy type of the lima buffers for each image type
+IMAGE_DTYPES = {Bpp8: '<u1', Bpp16: '<u2', Bpp32: '<i4'}
+
 
 class Sync(HwSyncCtrlObj):
 
@@ -133,13 +140,17 @@ class DetInfo(HwDetInfoCtrlObj):
         pass
 
 
-def gen_buffer(buffer_manager, nb_frames, frame_size):
-    for frame_nb in range(nb_frames):
-        buff = buffer_manager.getFrameBufferPtr(frame_nb)
+def frame_buffers(buffer_manager, nb_frames, frame_size, dtype='<i4'):
+    # lima reuses its buffers cyclically (frame n goes to buffer
+    # n % nb_buffers): build the array of each buffer once
+    nb_buffers = min(nb_frames, buffer_manager.getNbBuffers())
+    arrays = []
+    for buffer_nb in range(nb_buffers):
+        buff = buffer_manager.getFrameBufferPtr(buffer_nb)
         # don't know why the sip.voidptr has no size
         buff.setsize(frame_size)
-        # TODO: adjust numpy array type
-        yield numpy.frombuffer(buff, dtype='<i4')
+        arrays.append(numpy.frombuffer(buff, dtype=dtype))
+    return arrays
 
 
 def gen_frame(frames):
@@ -149,16 +160,40 @@ def gen_frame(frames):
         yield frame_info, frame
 
 
+def gen_narrow(frames, buffers):
+    # copy each 32 bit frame into the (smaller) lima buffer
+    for frame, buff in zip(frames, buffers):
+        numpy.copyto(buff, frame, casting='unsafe')
+        yield buff
+
+
 class Acquisition:
 
-    def __init__(self, detector, buffer_manager, nb_frames, frame_dim):
+    def __init__(self, detector, buffer_manager, nb_frames, frame_dim,
+                 priority=0, cpu=None):
         self.detector = detector
+        self.priority = priority
+        self.cpu = cpu
         self.buffer_manager = buffer_manager
         self.nb_acquired_frames = 0
         self.status = Status.Ready
         self.stopped = False
-        buffers = gen_buffer(buffer_manager, nb_frames, frame_dim.getMemSize())
-        self.frames = detector.gen_readout(nb_frames, buffers)
+        frame_size = frame_dim.getMemSize()
+        image_type = frame_dim.getImageType()
+        if image_type not in IMAGE_DTYPES:
+            raise ValueError("Unsupported image type {!r}".format(image_type))
+        dtype = numpy.dtype(IMAGE_DTYPES[image_type])
+        # built here, not on the first frame of the acquisition
+        arrays = frame_buffers(buffer_manager, nb_frames, frame_size, dtype)
+        buffers = itertools.cycle(arrays)
+        if dtype.itemsize == 4:
+            self.frames = detector.gen_readout(nb_frames, buffers)
+        else:
+            # the detector always sends 32 bit values whatever the number
+            # of readout bits so they are narrowed after each readout
+            scratch = numpy.empty(frame_size // dtype.itemsize, '<i4')
+            frames = detector.gen_readout(nb_frames, itertools.repeat(scratch))
+            self.frames = gen_narrow(frames, buffers)
         self.frame_infos = []
         for frame_nb in range(nb_frames):
             frame_info = HwFrameInfoType()
@@ -175,14 +210,32 @@ class Acquisition:
         self.stopped = True
         self.acq_thread.join()
 
+    def _set_scheduling(self):
+        # best effort (linux only, needs CAP_SYS_NICE for the priority).
+        # Only affects the calling thread which is dedicated to this
+        # acquisition so there is nothing to restore
+        if self.priority > 0 and hasattr(os, "sched_setscheduler"):
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO,
+                                      os.sched_param(self.priority))
+            except OSError as error:
+                log.warning("Cannot raise acquisition priority: %s", error)
+        if self.cpu is not None and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, {self.cpu})
+            except OSError as error:
+                log.warning("Cannot pin acquisition thread: %s", error)
+
     def acquire(self):
+        self._set_scheduling()
         buffer_manager = self.buffer_manager
         start_time = time.time()
         self.detector.start()
         self.status = Status.Exposure
         buffer_manager.setStartTimestamp(Timestamp(start_time))
+        new_frame_ready = buffer_manager.newFrameReady
         for _, frame_info in zip(self.frames, self.frame_infos):
-            buffer_manager.newFrameReady(frame_info)
+            new_frame_ready(frame_info)
             self.nb_acquired_frames += 1
             if self.stopped:
                 self.status = Status.Ready
@@ -192,9 +245,11 @@ class Acquisition:
 
 class Interface(HwInterface):
 
-    def __init__(self, detector):
+    def __init__(self, detector, acq_priority=0, acq_cpu=None):
         super().__init__()
         self.detector = detector
+        self.acq_priority = acq_priority
+        self.acq_cpu = acq_cpu
         self.det_info = DetInfo(detector)
         self.sync = Sync(detector)
         self.buff = SoftBufferCtrlObj()
@@ -211,7 +266,9 @@ class Interface(HwInterface):
         nb_frames = self.sync.getNbHwFrames()
         frame_dim = self.buff.getFrameDim()
         buffer_manager = self.buff.getBuffer()
-        self.acq = Acquisition(self.detector, buffer_manager, nb_frames, frame_dim)
+        self.acq = Acquisition(
+            self.detector, buffer_manager, nb_frames, frame_dim,
+            priority=self.acq_priority, cpu=self.acq_cpu)
 
     def startAcq(self):
         self.acq.start()
@@ -1,4 +1,5 @@
 import struct
+import shutil
 import asyncio
 import contextlib
 import urllib.parse
@@ -59,10 +60,8 @@ async def find_detectors(port=TCP_PORT, timeout=2.0):
 
 
 def detector_table(detectors):
-    import beautifultable
-
-    width = click.get_terminal_size()[0]
-    table = beautifultable.BeautifulTable(maxwidth=width)
+    width = shutil.get_terminal_size()[0]
+    table = BeautifulTable(maxwidth=width)
 
     table.columns.header = ["Host", "IP", "Port", "Version"]
     for detector in detectors:
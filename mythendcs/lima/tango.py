@@ -16,7 +16,7 @@ class MythenDCS(Device):
 
     def delete_device(self):
         super().delete_device()
-        self.mythen.connection.disconnect()
+        self.mythen.close()
 
     @property
     def mythen(self):
@@ -88,6 +88,16 @@ def test_write_read(server, conn, timeout):
     assert conn.write_read(b"-get version", 1024, timeout=timeout) == version
 
 
+@tcp_udp
+@timeout
+@version_buffer
+def test_write_read_reply_into(server, conn, timeout, buff):
+    version = server.mythen.config["version"].encode()
+    size = conn.write_read_reply_into(b"-get version", buff, timeout=timeout)
+    assert size == len(version)
+    assert bytes(buff) == version
+
+
 @tcp_udp
 @timeout
 @version_buffer
@@ -97,6 +107,19 @@ def test_write_read_exactly_into(server, conn, timeout, buff):
     assert bytes(buff) == version
 
 
+@tcp_udp
+def test_rcvbuf(server, conn):
+    with socket.socket(socket.AF_INET, conn.kind) as sock:
+        default = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    # smaller than the default: not capped by the system maximum (and,
+    # even if doubled as on linux, still different from the default)
+    conn.rcvbuf = default // 4
+    conn.connect()
+    assert conn.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) != default
+    version = server.mythen.config["version"].encode()
+    assert conn.write_read(b"-get version", 1024) == version
+
+
 @tcp_udp
 def test_timeout(server, conn):
     with pytest.raises(socket.timeout):
@@ -122,6 +122,16 @@ def test_error(tcp_conn):
     assert repr(err.value) == "MythenError({}, {!r})".format(err_code, err_msg)
 
 
+@tcp_udp
+def test_close(mythen):
+    version = mythen.version
+    with mythen:
+        assert mythen.connection.socket is not None
+    assert mythen.connection.socket is None
+    # reconnects on demand
+    assert mythen.version == version
+
+
 @tcp_udp
 @pytest.mark.slow
 def test_reset(mythen):
@@ -6,8 +6,8 @@ from mythendcs.core import TCP, UDP
 
 try:
     import Lima
-    from Lima.Core import CtControl, AcqRunning
-    from mythendcs.lima.camera import Interface
+    from Lima.Core import CtControl, AcqRunning, FrameDim, Bpp24
+    from mythendcs.lima.camera import Interface, Acquisition
 except ImportError:
     Lima = None
 
@@ -27,6 +27,14 @@ def test_creation(mythen):
     assert ctrl is not None
 
 
+@tcp_udp
+@skip_if_no_lima
+def test_unsupported_image_type(mythen):
+    frame_dim = FrameDim(1280, 1, Bpp24)
+    with pytest.raises(ValueError, match="Unsupported image type"):
+        Acquisition(mythen, None, 1, frame_dim)
+
+
 @tcp_udp
 @pytest.mark.parametrize("frames,inttime", [(5, 0.1), (500, 0.01)])
 @pytest.mark.slow